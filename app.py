@@ -1,12 +1,22 @@
 import json
+import os
+import tempfile
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Set
 
+import numpy as np
+import orjson
 import pandas as pd
 import streamlit as st
 
+from haystack_search import compiled_search, encode_needle, pack_haystacks
+
 PROJECT_ROOT = Path(__file__).resolve().parent
 DATA_PATH = PROJECT_ROOT.parent / "baza_dannykh" / "boilers_reference.json"
+SNAPSHOT_PATH = DATA_PATH.with_suffix(".flat.parquet")
+# bump whenever the layout of FlatIndex.frame changes so old snapshots are ignored
+SNAPSHOT_SCHEMA = 1
 
 st.set_page_config(page_title="База котлов ТЭЦ", layout="wide")
 
@@ -30,18 +40,65 @@ SURFACE_COLUMNS = [
     "notes",
 ]
 
+SURFACE_FILTER_KEYS = ("station", "boiler_type", "steel", "category", "system")
+
+# below this many rows the pandas str scan beats the JIT + dispatch overhead
+NUMBA_MIN_ROWS = 100_000
+
+
+def data_mtime() -> float:
+    if not DATA_PATH.exists():
+        return 0.0
+    return DATA_PATH.stat().st_mtime
+
 
-def load_data() -> Dict:
+@st.cache_data(show_spinner=False)
+def load_data(mtime: float) -> Dict:
+    # mtime is only a cache key: any write to the file yields a new entry
     if not DATA_PATH.exists():
         return {"boilers": []}
-    with DATA_PATH.open("r", encoding="utf-8") as handle:
-        return json.load(handle)
+    return orjson.loads(DATA_PATH.read_bytes())
+
+
+def session_data(mtime: float) -> Dict:
+    # reruns within a session reuse the parsed dict (and its id index)
+    # until the file changes
+    if st.session_state.get("_data_mtime") != mtime:
+        st.session_state["data"] = load_data(mtime)
+        st.session_state["boiler_index"] = index_boilers(st.session_state["data"])
+        st.session_state["_data_mtime"] = mtime
+    return st.session_state["data"]
+
+
+def clear_data_caches() -> None:
+    load_data.clear()
+    flatten_surfaces.clear()
+    steel_summary.clear()
+    data_json.clear()
+    surfaces_frame.clear()
+    surfaces_csv.clear()
 
 
 def save_data(data: Dict) -> None:
     DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with DATA_PATH.open("w", encoding="utf-8") as handle:
-        json.dump(data, handle, ensure_ascii=False, indent=2)
+    DATA_PATH.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    clear_data_caches()
+
+
+@st.cache_data(show_spinner=False)
+def data_json(mtime: float) -> str:
+    # the file is already indented JSON: hand it over without a parse/dump round trip
+    if not DATA_PATH.exists():
+        return orjson.dumps({"boilers": []}).decode("utf-8")
+    return DATA_PATH.read_text(encoding="utf-8")
+
+
+def parse_upload(raw: bytes) -> Dict:
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # orjson only takes bare UTF-8; stdlib json also detects a BOM and UTF-16/32
+        return json.loads(raw)
 
 
 def get_boiler_parameters(boiler: Dict) -> Dict:
@@ -60,9 +117,70 @@ def get_boiler_parameters(boiler: Dict) -> Dict:
     return result
 
 
-def flatten_surfaces(data: Dict) -> List[Dict]:
+def haystack_text(row: Dict) -> str:
+    parts = []
+    for value in row.values():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            parts.append(" ".join(map(str, value)))
+        else:
+            parts.append(str(value))
+    return " ".join(parts).lower()
+
+
+@dataclass
+class FlatIndex:
+    frame: pd.DataFrame
+    domains: Dict[str, List[str]]
+    haystacks: np.ndarray
+    boiler_ids: List[str]
+    # packed form of haystacks, only built when the numba search kernel is used
+    haystack_buffer: Optional[np.ndarray] = None
+    haystack_offsets: Optional[np.ndarray] = None
+
+
+def encode_filter_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    # few distinct values repeated on every row: dictionary-encode them.
+    # Also applied after read_parquet, which returns all-null columns as object.
+    for key in SURFACE_FILTER_KEYS:
+        frame[key] = frame[key].astype("category")
+    return frame
+
+
+def surfaces_to_frame(rows: List[Dict]) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(rows, columns=SURFACE_COLUMNS)
+    # list-valued steel grades are unhashable and would break isin()
+    frame["steel"] = frame["steel"].map(
+        lambda value: ", ".join(map(str, value)) if isinstance(value, (list, tuple)) else value
+    )
+    return encode_filter_columns(frame)
+
+
+def build_flat_index(data: Dict) -> FlatIndex:
     rows: List[Dict] = []
+    haystacks: List[str] = []
+    domains: Dict[str, Set[str]] = {key: set() for key in SURFACE_FILTER_KEYS}
+    # insertion-ordered set of the boiler ids, first occurrence wins
+    boiler_ids: Dict[str, None] = {}
+
+    def add_row(row: Dict) -> None:
+        rows.append(row)
+        haystacks.append(haystack_text(row))
+        for key in ("station", "boiler_type", "category", "system"):
+            if row.get(key):
+                domains[key].add(row[key])
+        steel_value = row.get("steel")
+        if isinstance(steel_value, (list, tuple)):
+            for piece in steel_value:
+                if piece:
+                    domains["steel"].add(str(piece))
+        elif steel_value:
+            domains["steel"].add(str(steel_value))
+
     for boiler in data.get("boilers", []):
+        if boiler.get("id"):
+            boiler_ids.setdefault(boiler["id"])
         boiler_info = {
             "boiler_id": boiler.get("id"),
             "boiler_name": boiler.get("name"),
@@ -87,10 +205,10 @@ def flatten_surfaces(data: Dict) -> List[Dict]:
             }
             components = surface.get("components", [])
             if not components:
-                rows.append(base_row)
+                add_row(base_row)
             else:
                 for component in components:
-                    rows.append({
+                    add_row({
                         **boiler_info,
                         "surface": f"{surface.get('name')} — {component.get('description')}",
                         "surface_group": surface.get("surface_group"),
@@ -105,35 +223,150 @@ def flatten_surfaces(data: Dict) -> List[Dict]:
                         "wall_thickness": component.get("wallThickness"),
                         "notes": component.get("notes", surface.get("notes", "")),
                     })
-    return rows
-
 
-def match_query(item: Dict, query: str) -> bool:
-    query = query.lower()
-    for value in item.values():
-        if value is None:
-            continue
-        if isinstance(value, (list, tuple)):
-            if query in " ".join(map(str, value)).lower():
-                return True
-        elif query in str(value).lower():
-            return True
-    return False
+    return FlatIndex(
+        frame=surfaces_to_frame(rows),
+        domains={key: sorted(values) for key, values in domains.items()},
+        haystacks=np.array(haystacks, dtype=object),
+        boiler_ids=list(boiler_ids),
+    )
 
 
-def find_boiler(data: Dict, boiler_id: str) -> Optional[Dict]:
+def read_snapshot(mtime: float) -> Optional[FlatIndex]:
+    if not mtime or not SNAPSHOT_PATH.exists():
+        return None
+    try:
+        frame = pd.read_parquet(SNAPSHOT_PATH)
+    except (ImportError, OSError, TypeError, ValueError):
+        return None
+    # DataFrame.attrs round-trips through the parquet metadata; file mtimes
+    # alone are not enough (cp -p / rsync -a can restore an older JSON)
+    meta = frame.attrs
+    if meta.get("source_mtime") != mtime or meta.get("schema") != SNAPSHOT_SCHEMA:
+        return None
+    frame.attrs = {}
+    haystacks = frame.pop("_hay").to_numpy(dtype=object)
+    frame = encode_filter_columns(frame)
+    return FlatIndex(frame=frame, domains=meta["domains"], haystacks=haystacks, boiler_ids=meta["boiler_ids"])
+
+
+def write_snapshot(flat: FlatIndex, mtime: float) -> None:
+    frame = flat.frame.assign(_hay=flat.haystacks)
+    frame.attrs = {
+        "source_mtime": mtime,
+        "schema": SNAPSHOT_SCHEMA,
+        "domains": flat.domains,
+        "boiler_ids": flat.boiler_ids,
+    }
+    try:
+        # write aside under a name unique to this writer and swap in, so neither
+        # a reader nor a second server process ever sees half a file
+        handle, partial_name = tempfile.mkstemp(dir=SNAPSHOT_PATH.parent, prefix=SNAPSHOT_PATH.name, suffix=".tmp")
+        os.close(handle)
+    except OSError:
+        return
+    partial = Path(partial_name)
+    try:
+        frame.to_parquet(partial, index=False)
+        partial.replace(SNAPSHOT_PATH)
+    except (ImportError, OSError, TypeError, ValueError):
+        # without a snapshot the next cold start simply flattens the JSON again
+        partial.unlink(missing_ok=True)
+
+
+# cache_resource hands out the shared object instead of an unpickled copy;
+# callers treat the index as read-only
+@st.cache_resource(show_spinner=False, max_entries=2)
+def flatten_surfaces(mtime: float) -> FlatIndex:
+    flat = read_snapshot(mtime)
+    if flat is None:
+        flat = build_flat_index(load_data(mtime))
+        if mtime:
+            write_snapshot(flat, mtime)
+    if len(flat.haystacks) >= NUMBA_MIN_ROWS and compiled_search() is not None:
+        flat.haystack_buffer, flat.haystack_offsets = pack_haystacks(flat.haystacks)
+    return flat
+
+
+def search_terms(query: str) -> List[str]:
+    terms = sorted(set(query.lower().split()), key=len, reverse=True)
+    # a term contained in a longer one is already implied by it
+    return [term for position, term in enumerate(terms) if not any(term in longer for longer in terms[:position])]
+
+
+def term_hits(flat: FlatIndex, candidates: np.ndarray, term: str) -> np.ndarray:
+    if flat.haystack_buffer is not None:
+        search = compiled_search()
+        return search(flat.haystack_buffer, flat.haystack_offsets, candidates, encode_needle(term))
+    hits = pd.Series(flat.haystacks[candidates], dtype=object).str.contains(term, regex=False)
+    return hits.to_numpy(dtype=bool)
+
+
+def search_mask(flat: FlatIndex, query: str) -> np.ndarray:
+    # every term has to occur in the row; the longest (most selective) term
+    # runs first and each next term only scans the rows still matching
+    candidates = np.arange(len(flat.haystacks))
+    for term in search_terms(query):
+        candidates = candidates[term_hits(flat, candidates, term)]
+        if not len(candidates):
+            break
+    mask = np.zeros(len(flat.haystacks), dtype=bool)
+    mask[candidates] = True
+    return mask
+
+
+def fill_text_blanks(frame: pd.DataFrame) -> pd.DataFrame:
+    text_columns = frame.select_dtypes(include=["object", "string"]).columns
+    frame[text_columns] = frame[text_columns].fillna("")
+    # categoricals only accept known values, so "" has to become one first
+    for column in frame.select_dtypes("category").columns:
+        if "" not in frame[column].cat.categories:
+            frame[column] = frame[column].cat.add_categories("")
+        frame[column] = frame[column].fillna("")
+    return frame
+
+
+# one entry per filter combination tried: keep only the recent ones
+@st.cache_data(show_spinner=False, max_entries=32)
+def surfaces_frame(mtime: float, filters: Dict) -> pd.DataFrame:
+    flat = flatten_surfaces(mtime)
+    frame = flat.frame
+    mask = np.ones(len(frame), dtype=bool)
+    for key in SURFACE_FILTER_KEYS:
+        selection = filters.get(key)
+        if selection:
+            mask &= frame[key].isin(selection).to_numpy()
+    query = filters.get("query")
+    if query:
+        mask &= search_mask(flat, query)
+    return fill_text_blanks(frame[mask].reset_index(drop=True))
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def surfaces_csv(mtime: float, filters: Dict) -> bytes:
+    return surfaces_frame(mtime, filters).to_csv(index=False).encode("utf-8")
+
+
+def index_boilers(data: Dict) -> Dict[str, Dict]:
+    index: Dict[str, Dict] = {}
     for boiler in data.get("boilers", []):
-        if boiler.get("id") == boiler_id:
-            return boiler
-    return None
+        if boiler.get("id"):
+            index.setdefault(boiler["id"], boiler)
+    return index
+
+
+def find_boiler(index: Dict[str, Dict], boiler_id: str) -> Optional[Dict]:
+    return index.get(boiler_id)
 
 
-def merge_uploaded_boilers(existing: Dict, incoming: Dict) -> int:
+def merge_uploaded_boilers(existing: Dict, incoming: Dict, index: Optional[Dict[str, Dict]] = None) -> int:
     count = 0
     incoming_list = incoming.get("boilers", [])
     if not incoming_list:
         return count
-    index = {boiler.get("id"): boiler for boiler in existing.get("boilers", [])}
+    if index is None:
+        index = index_boilers(existing)
+    names_by_boiler: Dict[str, Set[str]] = {}
     for candidate in incoming_list:
         candidate_id = candidate.get("id")
         candidate_surfaces = candidate.get("surfaces", [])
@@ -146,7 +379,10 @@ def merge_uploaded_boilers(existing: Dict, incoming: Dict) -> int:
             count += 1
             continue
         existing_surfaces = target.setdefault("surfaces", [])
-        existing_names = {surface.get("name") for surface in existing_surfaces if surface.get("name")}
+        existing_names = names_by_boiler.get(candidate_id)
+        if existing_names is None:
+            existing_names = {surface.get("name") for surface in existing_surfaces if surface.get("name")}
+            names_by_boiler[candidate_id] = existing_names
         for surface in candidate_surfaces:
             if surface.get("name") not in existing_names:
                 existing_surfaces.append(surface)
@@ -186,9 +422,16 @@ def build_surface_payload() -> Dict:
     }
 
 
-def collect_unique(data: List[Dict], key: str) -> List[str]:
-    values = {item[key] for item in data if item.get(key)}
-    return sorted(values)
+@st.cache_data(show_spinner=False)
+def steel_summary(mtime: float) -> pd.DataFrame:
+    grouped = flatten_surfaces(mtime).frame.groupby("steel", observed=True)
+    summary = pd.DataFrame(
+        {
+            "count": grouped.size(),
+            "boilers": grouped["boiler_id"].agg(lambda ids: ", ".join(sorted(set(ids.dropna())))),
+        }
+    )
+    return summary.reset_index()
 
 
 def build_boiler_table(data: Dict) -> List[Dict]:
@@ -220,59 +463,50 @@ def main() -> None:
         "Гибкий поиск: вводи станцию, тип котла, марку стали или любой текст — таблица адаптируется и показывает котлы, параметры и поверхности."
     )
 
-    data = load_data()
-    flattened = flatten_surfaces(data)
+    mtime = data_mtime()
+    data = session_data(mtime)
+    flat = flatten_surfaces(mtime)
     boiler_table = build_boiler_table(data)
+    boiler_index = st.session_state["boiler_index"]
 
-    stations = collect_unique(flattened, "station")
+    domains = flat.domains
+    stations = domains["station"]
     station_selection = st.sidebar.multiselect("Станция", stations, default=stations)
-    boiler_types = collect_unique(flattened, "boiler_type")
+    boiler_types = domains["boiler_type"]
     type_selection = st.sidebar.multiselect("Тип котла", boiler_types, default=boiler_types)
-    steel_set: Set[str] = set()
-    for row in flattened:
-        steel_value = row.get("steel")
-        if isinstance(steel_value, (list, tuple)):
-            for piece in steel_value:
-                if piece:
-                    steel_set.add(str(piece))
-        elif steel_value:
-            steel_set.add(str(steel_value))
-    steel_types = sorted(steel_set)
+    steel_types = domains["steel"]
     steel_selection = st.sidebar.multiselect("Марка стали", steel_types)
-    categories = collect_unique(flattened, "category")
+    categories = domains["category"]
     category_selection = st.sidebar.multiselect("Категория", categories, default=categories)
-    systems = collect_unique(flattened, "system")
+    systems = domains["system"]
     system_selection = st.sidebar.multiselect("Тракт", systems, default=systems)
 
-    query = st.sidebar.text_input("Свободный поиск", value="")
-
-    def row_matches(row: Dict) -> bool:
-        if station_selection and row.get("station") not in station_selection:
-            return False
-        if type_selection and row.get("boiler_type") not in type_selection:
-            return False
-        if steel_selection and row.get("steel") not in steel_selection:
-            return False
-        if category_selection and row.get("category") not in category_selection:
-            return False
-        if system_selection and row.get("system") not in system_selection:
-            return False
-        if query and not match_query(row, query):
-            return False
-        return True
-
-    filtered = [row for row in flattened if row_matches(row)]
+    # inside a form the query only reaches the script on Enter or "Найти",
+    # not on every keystroke
+    with st.sidebar.form("search"):
+        query = st.text_input("Свободный поиск", value="")
+        st.form_submit_button("Найти")
+
+    filters = {
+        "station": station_selection,
+        "boiler_type": type_selection,
+        "steel": steel_selection,
+        "category": category_selection,
+        "system": system_selection,
+        "query": query,
+    }
+    filtered = surfaces_frame(mtime, filters)
 
     st.sidebar.markdown("---")
-    st.sidebar.metric("Котлы в выборке", len({row["boiler_id"] for row in filtered}))
+    st.sidebar.metric("Котлы в выборке", filtered["boiler_id"].nunique())
     st.sidebar.metric("Поверхностей в выборке", len(filtered))
 
     tabs = st.tabs(["Поверхности", "Котлы и станции", "Марки сталей"])
 
     with tabs[0]:
-        if filtered:
-            st.dataframe(pd.DataFrame(filtered).fillna("").reindex(columns=SURFACE_COLUMNS))
-            csv = pd.DataFrame(filtered).to_csv(index=False).encode("utf-8")
+        if not filtered.empty:
+            st.dataframe(filtered)
+            csv = surfaces_csv(mtime, filters)
             st.download_button("Скачать выборку поверхностей (CSV)", csv, "surfaces.csv", "text/csv")
         else:
             st.info("Совпадений нет — расширьте фильтры или используйте свободный поиск")
@@ -297,24 +531,19 @@ def main() -> None:
                 }
             )
         if station_rows:
-            st.dataframe(pd.DataFrame(station_rows).fillna(""))
+            st.dataframe(fill_text_blanks(pd.DataFrame.from_records(station_rows)))
         else:
             st.info("По выбранным фильтрам нет котлов")
 
     with tabs[2]:
-        steel_rows = []
-        for steel in steel_types:
-            count = sum(1 for row in flattened if row.get("steel") == steel)
-            boilers = sorted({row["boiler_id"] for row in flattened if row.get("steel") == steel})
-            steel_rows.append({"steel": steel, "count": count, "boilers": ", ".join(boilers)})
-        if steel_rows:
-            st.dataframe(pd.DataFrame(steel_rows))
+        steel_table = steel_summary(mtime)
+        if not steel_table.empty:
+            st.dataframe(steel_table)
         else:
             st.info("Не удалось собрать список марок стали")
 
     st.header("Добавление данных")
-    boiler_options = [boiler.get("id") for boiler in data.get("boilers", []) if boiler.get("id")] or ["Новый котёл"]
-    boiler_selection = st.selectbox("Выберите существующий котёл или создайте новый", ["Новый котёл"] + boiler_options)
+    boiler_selection = st.selectbox("Выберите существующий котёл или создайте новый", ["Новый котёл"] + flat.boiler_ids)
     new_boiler: Dict = {}
     if boiler_selection == "Новый котёл":
         new_boiler_id = st.text_input("ID нового котла", key="new_boiler_id")
@@ -339,10 +568,11 @@ def main() -> None:
                     new_record = {key: value for key, value in new_boiler.items() if value}
                     new_record["surfaces"] = [surface_payload]
                     data.setdefault("boilers", []).append(new_record)
+                    boiler_index.setdefault(new_record["id"], new_record)
                     save_data(data)
                     st.success("Добавлен новый котёл и поверхность")
             else:
-                target = find_boiler(data, boiler_selection)
+                target = find_boiler(boiler_index, boiler_selection)
                 if target is None:
                     st.error("Выбранный котёл не найден")
                 else:
@@ -354,11 +584,11 @@ def main() -> None:
     uploaded = st.file_uploader("Загрузите JSON с массивом boilers", type=["json"])
     if uploaded:
         try:
-            incoming = json.load(uploaded)
+            incoming = parse_upload(uploaded.getvalue())
         except json.JSONDecodeError as exc:
             st.error(f"Не удалось прочитать файл: {exc}")
             return
-        added = merge_uploaded_boilers(data, incoming)
+        added = merge_uploaded_boilers(data, incoming, boiler_index)
         if added:
             save_data(data)
             st.success(f"Импортировано {added} новых записей/поверхностей")
@@ -369,6 +599,8 @@ def main() -> None:
     if st.button("Удалить текущую базу"):
         if DATA_PATH.exists():
             DATA_PATH.unlink()
+            SNAPSHOT_PATH.unlink(missing_ok=True)
+            clear_data_caches()
             data = {"boilers": []}
             st.success("Файл `boilers_reference.json` удалён. Можешь загрузить новую базу через форму выше.")
         else:
@@ -376,7 +608,9 @@ def main() -> None:
 
     st.header("Исходные данные")
     with st.expander("Посмотреть JSON-структуру базы"):  # noqa: SIM101
-        st.json(data)
+        # the expander body runs even when collapsed, so the payload is opt-in
+        if st.checkbox("Показать JSON", key="show_json"):
+            st.json(data_json(data_mtime()))
 
 
 if __name__ == "__main__":
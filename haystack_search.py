@@ -0,0 +1,113 @@
+import threading
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:  # optional: only pays off on very large bases
+    njit = None
+    prange = range
+
+# Streamlit runs every session's script in its own thread, so the kernel can be
+# entered concurrently; numba's fallback "workqueue" layer aborts the process then
+SAFE_THREADING_LAYERS = ("tbb", "omp")
+
+compile_lock = threading.Lock()
+
+# rows whose expected hits are known, used to check the compiled kernel
+# against pandas str.contains before app.py is allowed to use it
+CHECK_HAYSTACKS = [
+    "тп-108 пароперегреватель 12x18h12t 565",
+    "экономайзер высокого давления эвд 20",
+    "",
+    "левый боковой экран 12х1мф",
+]
+CHECK_NEEDLES = [
+    "12x18h12t",
+    "эконом",
+    "20",
+    "565",
+    # spans the end of one row and the start of the next: must not match
+    "565 экономайзер",
+    # ends exactly at the end of the last row
+    "12х1мф",
+    "мф",
+    "нет такого",
+]
+
+
+def scan_rows(buffer: np.ndarray, offsets: np.ndarray, candidates: np.ndarray, needle: np.ndarray) -> np.ndarray:
+    hits = np.zeros(len(candidates), dtype=np.bool_)
+    width = len(needle)
+    for position in prange(len(candidates)):
+        row = candidates[position]
+        end = offsets[row + 1] - 1
+        for start in range(offsets[row], end - width + 1):
+            matched = True
+            for shift in range(width):
+                if buffer[start + shift] != needle[shift]:
+                    matched = False
+                    break
+            if matched:
+                hits[position] = True
+                break
+    return hits
+
+
+def pack_haystacks(haystacks: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # UTF-8 haystacks joined by NUL bytes, row i spans offsets[i]:offsets[i + 1] - 1;
+    # UTF-8 is self-synchronising, so a byte match is a character match
+    encoded = [haystack.encode("utf-8") for haystack in haystacks]
+    buffer = np.frombuffer(b"\x00".join(encoded), dtype=np.uint8)
+    offsets = np.cumsum([0] + [len(item) + 1 for item in encoded], dtype=np.int64)
+    return buffer, offsets
+
+
+def encode_needle(term: str) -> np.ndarray:
+    return np.frombuffer(term.encode("utf-8"), dtype=np.uint8)
+
+
+def kernel_matches_pandas(kernel: Callable, haystacks: List[str] = CHECK_HAYSTACKS) -> bool:
+    buffer, offsets = pack_haystacks(haystacks)
+    series = pd.Series(haystacks, dtype=object)
+    candidates = np.arange(len(haystacks))
+    for needle in CHECK_NEEDLES:
+        expected = series.str.contains(needle, regex=False).to_numpy(dtype=bool)
+        if not np.array_equal(kernel(buffer, offsets, candidates, encode_needle(needle)), expected):
+            return False
+        # a candidate subset must report hits in the order of the candidates
+        subset = candidates[::-2]
+        if not np.array_equal(kernel(buffer, offsets, subset, encode_needle(needle)), expected[subset]):
+            return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def load_kernel() -> Optional[Callable]:
+    if njit is None:
+        return None
+    # must be set before the first parallel launch; raises on that launch
+    # if neither TBB nor OpenMP can be loaded
+    numba.config.THREADING_LAYER = "threadsafe"
+    kernel = njit(parallel=True, cache=True)(scan_rows)
+    try:
+        if not kernel_matches_pandas(kernel):
+            return None
+    except ValueError:
+        return None
+    # another parallel function may have fixed the layer before this one ran
+    if numba.threading_layer() not in SAFE_THREADING_LAYERS:
+        return None
+    return kernel
+
+
+def compiled_search() -> Optional[Callable]:
+    # compiled once per process: app.py is re-executed on every Streamlit
+    # rerun, this module is not. The lock keeps concurrent first calls from
+    # running the self-check in parallel before the threading layer is known.
+    with compile_lock:
+        return load_kernel()